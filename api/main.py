@@ -9,23 +9,31 @@ Ce module expose les points d'accès (endpoints) web pour :
 """
 
 import os
+
+# Couche de threads numba fork-safe : avec TBB, le processus serveur se bloque
+# à l'arrêt une fois le ProcessPoolExecutor (fork) utilisé. Doit être défini
+# avant le premier import de numba.
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
+
 import uuid
 import asyncio
 import base64
-import io as BytesIO
 import itertools
-import json
+import math
 from typing import Dict, Any
-from queue import Queue
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sse_starlette.sse import EventSourceResponse
+import cv2
+import orjson
 import numpy as np
-from PIL import Image
 import yaml
+from numba import njit, prange
 
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -33,7 +41,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.dark_channel_prior import core as dcp_core
 from src.dark_channel_prior.algorithms import (
     get_dark_channel, estimate_atmospheric_light, estimate_initial_transmission,
-    refine_transmission_guided_filter, recover_scene_radiance
+    refine_transmission_guided_filter, recover_scene_radiance, compute_guide_integrals
 )
 from src.dark_channel_prior.preprocessing import convert_to_grayscale
 
@@ -54,9 +62,193 @@ app.add_middleware(
 )
 
 # --- Variables globales et gestion d'état ---
-log_queues: Dict[str, Queue] = {}
+log_queues: Dict[str, asyncio.Queue] = {}
+
+# Jobs dont le consommateur SSE s'est déconnecté (ou n'est jamais venu) :
+# leurs messages sont jetés au lieu de bloquer les producteurs sur une file
+# pleine que personne ne vide.
+abandoned_jobs: set = set()
+
+# Temps d'attente maximal d'un put() sur une file pleine : si aucun
+# consommateur ne la vide dans ce délai (client jamais connecté au flux SSE,
+# ou définitivement à l'arrêt), le job est marqué abandonné.
+_SSE_PUT_TIMEOUT = 30
+
+# Résultats d'expérience encodés (WebP), servis via /result/{job_id}/{run_index}.
+# Conservés _RESULT_CACHE_TTL secondes après la fin du job (les vues
+# comparaison/modale re-téléchargent les images bien après experiment_done),
+# avec une borne sur le nombre de jobs gardés en mémoire.
+result_cache: Dict[str, Dict[int, bytes]] = {}
+_RESULT_CACHE_TTL = 600
+_RESULT_CACHE_MAX_JOBS = 16
+
+_executor: ProcessPoolExecutor = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Crée (paresseusement) le pool de processus partagé pour les expériences."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
+
+
+# Valeurs par défaut d'une combinaison d'expérience, figées au niveau module :
+# une seule fusion de dictionnaires par combinaison au lieu d'un .get() par clé.
+_DEFAULT_RUN_PARAMS = {
+    'patch_size': 15,
+    'omega': 0.95,
+    'atmospheric_light_percentile': 0.001,
+    't0': 0.1,
+    'gf_radius': 60,
+    'gf_epsilon': 1e-3,
+}
+
+# État propre à chaque processus worker : caches des étapes du pipeline,
+# réinitialisés quand le worker change de tâche (job_id différent).
+_worker_state: Dict[str, Any] = {"job_id": None}
+
+def _experiment_worker(job_id: str, shm_name: str, shape: tuple, dtype_name: str, run_params: Dict[str, Any]) -> np.ndarray:
+    """
+    Exécute une combinaison de paramètres dans un processus worker.
+
+    L'image brumeuse est lue depuis un bloc de mémoire partagée créé par le
+    parent : le coût d'envoi d'une tâche ne dépend plus de la taille de
+    l'image, seulement de ses métadonnées (nom, forme, dtype).
+
+    Chaque worker conserve ses caches d'étapes (canal sombre, lumière
+    atmosphérique, transmissions) entre les combinaisons d'un même job.
+    Les cartes mises en cache sont stockées en float16 (précision largement
+    suffisante pour des sorties issues de sources 8 bits) : le calcul reste en
+    float32, seul le stockage est réduit de moitié.
+
+    Args:
+        job_id (str): Identifiant du job en cours.
+        shm_name (str): Nom du bloc de mémoire partagée contenant l'image.
+        shape (tuple): Forme de l'image brumeuse.
+        dtype_name (str): Nom du dtype de l'image.
+        run_params (Dict[str, Any]): Paramètres de cette combinaison.
+
+    Returns:
+        np.ndarray: L'image finale débruitée (float 0-1).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        hazy_image = np.ndarray(shape, dtype=np.dtype(dtype_name), buffer=shm.buf)
+        return _run_combination(job_id, hazy_image, run_params)
+    finally:
+        shm.close()
+
+
+def _run_combination(job_id: str, hazy_image: np.ndarray, run_params: Dict[str, Any]) -> np.ndarray:
+    """Corps du worker : caches d'étapes et exécution d'une combinaison."""
+    if _worker_state["job_id"] != job_id:
+        _worker_state.clear()
+        _worker_state.update({
+            "job_id": job_id,
+            "hazy_gray": convert_to_grayscale(hazy_image),
+            "dark_channel": {},
+            "light": {},
+            "transmission": {},
+        })
+        _worker_state["guide_integrals"] = compute_guide_integrals(_worker_state["hazy_gray"])
+
+    params = {**_DEFAULT_RUN_PARAMS, **run_params}
+    patch_size = params['patch_size']
+    omega = params['omega']
+    percentile = params['atmospheric_light_percentile']
+    t0 = params['t0']
+    gf_radius = params['gf_radius']
+    gf_epsilon = params['gf_epsilon']
+
+    dark_channel_cache = _worker_state["dark_channel"]
+    if patch_size not in dark_channel_cache:
+        dark_channel_cache[patch_size] = get_dark_channel(hazy_image, patch_size).astype(np.float16)
+
+    light_key = (patch_size, percentile)
+    if light_key not in _worker_state["light"]:
+        _worker_state["light"][light_key] = estimate_atmospheric_light(
+            hazy_image, dark_channel_cache[patch_size], percentile
+        )
+    atmospheric_light = _worker_state["light"][light_key]
+
+    transmission_key = (patch_size, percentile, omega)
+    if transmission_key not in _worker_state["transmission"]:
+        _worker_state["transmission"][transmission_key] = estimate_initial_transmission(
+            hazy_image, atmospheric_light, patch_size, omega
+        ).astype(np.float16)
+
+    # La transmission affinée n'est pas mise en cache : sa clé inclut
+    # (gf_radius, gf_epsilon), donc un balayage typique n'y ferait jamais de
+    # hit (un hit ne servirait que si t0 seul variait) alors qu'une carte par
+    # combinaison serait retenue pour toute la durée du job.
+    refined_transmission = refine_transmission_guided_filter(
+        _worker_state["transmission"][transmission_key].astype(np.float32),
+        _worker_state["hazy_gray"],
+        gf_radius, gf_epsilon, guide_integrals=_worker_state["guide_integrals"]
+    )
+
+    return recover_scene_radiance(
+        hazy_image, atmospheric_light, refined_transmission, t0
+    )
 
 # --- Fonctions utilitaires de l'API ---
+@njit(parallel=True, fastmath=True, cache=True)
+def _to_uint8_flat(flat: np.ndarray) -> np.ndarray:
+    """Clip, mise à l'échelle et cast uint8 fusionnés en une seule passe."""
+    out = np.empty(flat.size, dtype=np.uint8)
+    for i in prange(flat.size):
+        v = flat[i] * 255.0
+        if v < 0.0:
+            out[i] = 0
+        elif v > 255.0:
+            out[i] = 255
+        else:
+            out[i] = np.uint8(v + 0.5)
+    return out
+
+
+def _to_uint8(img_np: np.ndarray) -> np.ndarray:
+    """
+    Convertit une image float (0-1) en uint8 en une seule passe mémoire.
+
+    Remplace la chaîne np.clip(img*255, 0, 255).astype(np.uint8) qui faisait
+    trois passes sur le tableau avec deux temporaires float intermédiaires.
+
+    Args:
+        img_np (np.ndarray): Image flottante à convertir.
+
+    Returns:
+        np.ndarray: Image uint8 de même forme.
+    """
+    flat = np.ascontiguousarray(img_np, dtype=np.float32).ravel()
+    return _to_uint8_flat(flat).reshape(img_np.shape)
+
+
+# Pré-compilation du noyau à l'import, comme pour ceux d'algorithms.py.
+_to_uint8(np.zeros((4, 4, 3), dtype=np.float32))
+
+
+def _decode_upload(buf: bytes) -> np.ndarray:
+    """
+    Décode les octets d'un upload en tableau RGB float32 (0-1).
+
+    Utilise cv2.imdecode (SIMD) plutôt que PIL : le tampon est enveloppé sans
+    copie par np.frombuffer et le passage en flottant se fait en une seule
+    multiplication par 1/255.
+
+    Args:
+        buf (bytes): Contenu brut du fichier uploadé.
+
+    Returns:
+        np.ndarray: Image RGB (float32, 0-1).
+    """
+    arr = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+    if arr is None:
+        raise ValueError("Format d'image non reconnu.")
+    cv2.cvtColor(arr, cv2.COLOR_BGR2RGB, arr)
+    return arr.astype(np.float32) * np.float32(1.0 / 255.0)
+
+
 def get_config_from_form(form_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Construit le dictionnaire de configuration à partir des données du formulaire.
@@ -83,10 +275,38 @@ def get_config_from_form(form_data: Dict[str, Any]) -> Dict[str, Any]:
         }
     }
 
+def _encode_webp(img_np: np.ndarray) -> bytes:
+    """
+    Encode une image (float 0-1 ou uint8) en WebP (qualité 85).
+
+    À qualité visuelle égale, le WebP est ~3 fois plus compact que le PNG pour
+    des images photographiques.
+
+    Args:
+        img_np (np.ndarray): L'image à encoder.
+
+    Returns:
+        bytes: Les octets du fichier WebP.
+    """
+    if img_np.dtype != np.uint8:
+        img_uint8 = _to_uint8(img_np)
+    else:
+        img_uint8 = img_np
+
+    if img_uint8.ndim == 3:
+        img_uint8 = cv2.cvtColor(img_uint8, cv2.COLOR_RGB2BGR)
+
+    _, buffer = cv2.imencode('.webp', img_uint8, [int(cv2.IMWRITE_WEBP_QUALITY), 85])
+    return buffer.tobytes()
+
+
 def image_to_base64(img_np: np.ndarray) -> str:
     """
     Convertit une image (tableau NumPy) en une chaîne de caractères base64.
 
+    L'encodage se fait en JPEG via OpenCV : bien plus rapide que le PNG de PIL
+    sur des images photographiques, pour un payload SSE 5 à 10 fois plus petit.
+
     Args:
         img_np (np.ndarray): L'image à convertir.
 
@@ -94,15 +314,26 @@ def image_to_base64(img_np: np.ndarray) -> str:
         str: La chaîne base64 préfixée pour l'affichage en HTML.
     """
     if img_np.dtype != np.uint8:
-        img_uint8 = np.clip(img_np * 255, 0, 255).astype(np.uint8)
+        img_uint8 = _to_uint8(img_np)
     else:
         img_uint8 = img_np
-    
-    pil_img = Image.fromarray(img_uint8)
-    buffer = BytesIO.BytesIO()
-    pil_img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    return f"data:image/png;base64,{img_str}"
+
+    if img_uint8.ndim == 3:
+        img_uint8 = cv2.cvtColor(img_uint8, cv2.COLOR_RGB2BGR)
+
+    _, buffer = cv2.imencode('.jpg', img_uint8, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+    img_str = base64.b64encode(buffer).decode("ascii")
+    return f"data:image/jpeg;base64,{img_str}"
+
+# Configuration par défaut chargée une seule fois au démarrage, avec le
+# parseur C de libyaml quand il est disponible (~20x plus rapide que le
+# parseur pur Python, et de toute façon plus jamais sollicité ensuite).
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+try:
+    with open('configs/default.yaml', 'r') as f:
+        DEFAULT_CONFIG = yaml.load(f, Loader=_YAML_LOADER)
+except FileNotFoundError:
+    DEFAULT_CONFIG = None
 
 # --- Définition des Endpoints de l'API ---
 
@@ -119,16 +350,14 @@ async def serve_frontend():
 @app.get("/default-config")
 async def get_default_config():
     """
-    Sert la configuration par défaut depuis le fichier YAML.
+    Sert la configuration par défaut (mise en cache au démarrage).
 
     Returns:
         Dict[str, Any]: Le contenu du fichier de configuration.
     """
-    try:
-        with open('configs/default.yaml', 'r') as f:
-            return yaml.safe_load(f)
-    except FileNotFoundError:
+    if DEFAULT_CONFIG is None:
         raise HTTPException(status_code=404, detail="Fichier de configuration par défaut non trouvé.")
+    return DEFAULT_CONFIG
 
 # --- Endpoint pour un traitement unique ---
 @app.post("/process-image/")
@@ -145,12 +374,11 @@ async def process_image_endpoint(
     Endpoint pour recevoir une image et lancer un traitement unique.
     """
     job_id = str(uuid.uuid4())
-    log_queues[job_id] = Queue()
+    log_queues[job_id] = asyncio.Queue(maxsize=256)
 
     try:
         contents = await image.read()
-        hazy_image_pil = Image.open(BytesIO.BytesIO(contents)).convert('RGB')
-        hazy_image_np = np.array(hazy_image_pil, dtype=np.float32) / 255.0
+        hazy_image_np = await asyncio.get_event_loop().run_in_executor(None, _decode_upload, contents)
     except Exception:
         raise HTTPException(status_code=400, detail="Fichier image invalide.")
 
@@ -177,14 +405,23 @@ async def process_experiment_endpoint(
     Endpoint pour lancer une batterie d'expériences basées sur une grille de paramètres.
     """
     job_id = str(uuid.uuid4())
-    log_queues[job_id] = Queue()
+    log_queues[job_id] = asyncio.Queue(maxsize=256)
+    # Borne mémoire : au-delà de _RESULT_CACHE_MAX_JOBS jobs en cache, les
+    # plus anciens (ordre d'insertion du dict) sont évincés. Les jobs encore
+    # actifs (présents dans log_queues) ne sont jamais évincés : retirer le
+    # dict d'un job en cours casserait ses emit_result.
+    while len(result_cache) >= _RESULT_CACHE_MAX_JOBS:
+        oldest = next((j for j in result_cache if j not in log_queues), None)
+        if oldest is None:
+            break
+        result_cache.pop(oldest)
+    result_cache[job_id] = {}
 
     try:
-        param_grid_dict = json.loads(parameter_grid)
+        param_grid_dict = orjson.loads(parameter_grid)
         contents = await image.read()
-        hazy_image_pil = Image.open(BytesIO.BytesIO(contents)).convert('RGB')
-        hazy_image_np = np.array(hazy_image_pil, dtype=np.float32) / 255.0
-    except (json.JSONDecodeError, KeyError):
+        hazy_image_np = await asyncio.get_event_loop().run_in_executor(None, _decode_upload, contents)
+    except (orjson.JSONDecodeError, KeyError):
         raise HTTPException(status_code=400, detail="Grille de paramètres JSON invalide.")
     except Exception:
         raise HTTPException(status_code=400, detail="Fichier image invalide.")
@@ -196,82 +433,179 @@ async def process_experiment_endpoint(
     return {"job_id": job_id}
 
 
+async def _post(job_id: str, payload: Dict):
+    """
+    Dépose un message dans la file SSE d'un job.
+
+    Le put() borné exerce la contre-pression habituelle, mais si le client
+    s'est déconnecté (job marqué abandonné, file vidée par le générateur),
+    le message est simplement jeté : les producteurs ne restent jamais
+    bloqués sur une file que plus personne ne consomme. Le délai sur le
+    put() couvre le cas où aucun flux SSE ne s'est jamais attaché (client
+    en panne entre le POST et l'EventSource, usage curl/API) : au-delà,
+    le job est marqué abandonné et les messages suivants sont jetés.
+    """
+    if job_id in abandoned_jobs:
+        return
+    log_queue = log_queues.get(job_id)
+    if log_queue is None:
+        return
+    try:
+        await asyncio.wait_for(log_queue.put(payload), timeout=_SSE_PUT_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Aucun consommateur SSE pour le job {job_id}, messages abandonnés.")
+        abandoned_jobs.add(job_id)
+
+
 async def run_single_processing(job_id: str, hazy_image: np.ndarray, config: Dict):
     """Orchestre le traitement d'une seule image et nettoie les ressources."""
-    log_queue = log_queues[job_id]
-    
+    loop = asyncio.get_event_loop()
+
     def log_callback(message: str, data: Dict = None):
-        """Fonction de rappel pour envoyer des messages au client."""
+        """Fonction de rappel (appelée depuis le thread de calcul) pour le client."""
         payload = {"type": "log", "message": message}
         if data:
             data["type"] = "result_intermediate"
             payload.update(data)
-        log_queue.put(payload)
+        # put() borné : bloque le thread de calcul si le consommateur SSE
+        # est à la traîne, au lieu d'accumuler sans limite. _post jette le
+        # message (sans bloquer) si le client s'est déconnecté.
+        asyncio.run_coroutine_threadsafe(_post(job_id, payload), loop).result()
 
     try:
-        dcp_core.run_haze_removal_pipeline(
-            hazy_image=hazy_image,
-            config=config,
-            log_callback=log_callback,
-            image_to_base64_func=image_to_base64
+        # Le pipeline (calcul NumPy + encodage JPEG) tourne sur un thread du
+        # pool par défaut pour ne pas bloquer la boucle d'événements.
+        await loop.run_in_executor(
+            None,
+            lambda: dcp_core.run_haze_removal_pipeline(
+                hazy_image=hazy_image,
+                config=config,
+                log_callback=log_callback,
+                image_to_base64_func=image_to_base64
+            )
         )
-        log_queue.put({"type": "done", "message": "Traitement unique terminé."})
+        await _post(job_id, {"type": "done", "message": "Traitement unique terminé."})
     except Exception as e:
-        log_queue.put({"type": "error", "message": f"Erreur critique: {e}"})
+        await _post(job_id, {"type": "error", "message": f"Erreur critique: {e}"})
     finally:
-        await asyncio.sleep(5) 
+        await asyncio.sleep(5)
         if job_id in log_queues:
             del log_queues[job_id]
+        abandoned_jobs.discard(job_id)
 
 
 async def run_experiment_processing(job_id: str, hazy_image: np.ndarray, param_grid: Dict):
     """Orchestre une batterie d'expériences."""
-    log_queue = log_queues[job_id]
-    
     param_names = list(param_grid.keys())
     param_values = list(param_grid.values())
-    combinations = list(itertools.product(*param_values))
-
-    log_queue.put({"type": "experiment_start", "total_runs": len(combinations)})
+    total_runs = math.prod(len(values) for values in param_values)
+
+    await _post(job_id, {"type": "experiment_start", "total_runs": total_runs})
+
+    loop = asyncio.get_event_loop()
+    executor = _get_executor()
+
+    # L'image est placée une seule fois en mémoire partagée : chaque tâche ne
+    # transporte que (nom, forme, dtype) au lieu de sérialiser tout le tableau.
+    shm = shared_memory.SharedMemory(create=True, size=hazy_image.nbytes)
+    shm_view = np.ndarray(hazy_image.shape, dtype=hazy_image.dtype, buffer=shm.buf)
+    shm_view[:] = hazy_image
+    image_ref = (shm.name, hazy_image.shape, hazy_image.dtype.name)
+
+    # Le produit cartésien est parcouru paresseusement et le nombre de tâches
+    # en vol est borné : la mémoire reste constante quelle que soit la taille
+    # de la grille, et le put() borné de _post exerce une contre-pression
+    # quand le consommateur SSE est plus lent que les workers.
+    max_pending = (os.cpu_count() or 1) * 2
+    pending: Dict[asyncio.Future, tuple] = {}   # future -> (clé, params, [indices])
+    future_by_key: Dict[str, asyncio.Future] = {}
+    encoded_by_key: Dict[str, bytes] = {}
+
+    async def emit_result(run_params: Dict[str, Any], run_index: int, encoded: bytes):
+        """Publie un résultat (octets WebP déjà encodés) pour un index de run."""
+        # setdefault : si le dict du job a malgré tout disparu, le run continue
+        # et les anciens résultats dégradent en 404 au lieu de tuer le job.
+        result_cache.setdefault(job_id, {})[run_index] = encoded
+        await _post(job_id, {
+            "type": "run_result",
+            "url": f"/result/{job_id}/{run_index}",
+            "params": run_params,
+            "run_index": run_index
+        })
+
+    async def drain(done_futures):
+        """Encode et publie les résultats des tâches terminées."""
+        for future in done_futures:
+            canonical_key, run_params, run_indices = pending.pop(future)
+            encoded = _encode_webp(future.result())
+            encoded_by_key[canonical_key] = encoded
+            for run_index in run_indices:
+                await emit_result(run_params, run_index, encoded)
 
     try:
-        for i, combo in enumerate(combinations):
+        for i, combo in enumerate(itertools.product(*param_values)):
             run_params = dict(zip(param_names, combo))
-            log_queue.put({"type": "log", "message": f"Calcul de la combinaison {i+1}/{len(combinations)}: {run_params}"})
-            
-            run_config = {
-                'algorithm': {
-                    'patch_size': run_params.get('patch_size', 15),
-                    'omega': run_params.get('omega', 0.95),
-                    'atmospheric_light_percentile': run_params.get('atmospheric_light_percentile', 0.001),
-                    't0': run_params.get('t0', 0.1)
-                },
-                'refinement': {
-                    'guided_filter': {
-                        'radius': run_params.get('gf_radius', 60),
-                        'epsilon': run_params.get('gf_epsilon', 1e-3)
-                    }
-                }
-            }
-            
-            final_image = dcp_core.process_image_for_experiment(hazy_image, run_config)
-            final_image_b64 = image_to_base64(final_image)
-
-            log_queue.put({
-                "type": "run_result",
-                "image": final_image_b64,
-                "params": run_params,
-                "run_index": i
-            })
-            await asyncio.sleep(0.01)
-
-        log_queue.put({"type": "experiment_done", "message": "Expérience terminée avec succès."})
+            canonical_key = orjson.dumps(run_params, option=orjson.OPT_SORT_KEYS)
+
+            if canonical_key in encoded_by_key:
+                # Configuration déjà calculée (doublon dans la grille).
+                await emit_result(run_params, i, encoded_by_key[canonical_key])
+                continue
+
+            duplicate_future = future_by_key.get(canonical_key)
+            if duplicate_future is not None and duplicate_future in pending:
+                pending[duplicate_future][2].append(i)
+                continue
+
+            while len(pending) >= max_pending:
+                done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+                await drain(done)
+
+            future = loop.run_in_executor(
+                executor, _experiment_worker, job_id, *image_ref, run_params
+            )
+            future_by_key[canonical_key] = future
+            pending[future] = (canonical_key, run_params, [i])
+
+        while pending:
+            done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+            await drain(done)
+
+        await _post(job_id, {"type": "experiment_done", "message": "Expérience terminée avec succès."})
     except Exception as e:
-        log_queue.put({"type": "error", "message": f"Erreur critique durant l'expérience: {e}"})
+        await _post(job_id, {"type": "error", "message": f"Erreur critique durant l'expérience: {e}"})
     finally:
+        del shm_view
+        shm.close()
+        shm.unlink()
         await asyncio.sleep(5)
         if job_id in log_queues:
             del log_queues[job_id]
+        abandoned_jobs.discard(job_id)
+        # Les résultats restent servis pendant le TTL : le frontend les
+        # re-télécharge pour les vues comparaison/modale après la fin du run.
+        loop.call_later(_RESULT_CACHE_TTL, result_cache.pop, job_id, None)
+
+
+@app.get("/result/{job_id}/{run_index}")
+async def get_run_result(job_id: str, run_index: int):
+    """
+    Sert l'image WebP d'un résultat d'expérience.
+
+    Les événements SSE ne transportent plus que l'URL (~80 octets) ; le
+    navigateur récupère les octets binaires ici, en parallèle sur plusieurs
+    connexions HTTP.
+    """
+    job_results = result_cache.get(job_id)
+    if job_results is None or run_index not in job_results:
+        raise HTTPException(status_code=404, detail="Résultat introuvable ou expiré.")
+    # L'URL est unique (job + index) et le contenu immuable : le navigateur
+    # peut resservir l'image depuis son cache même après expiration du TTL.
+    return Response(
+        content=job_results[run_index],
+        media_type="image/webp",
+        headers={"Cache-Control": "public, max-age=3600, immutable"},
+    )
 
 
 @app.get("/stream-logs/{job_id}")
@@ -285,19 +619,29 @@ async def stream_logs(job_id: str):
         return EventSourceResponse(empty_stream())
 
     async def event_generator():
-        """Générateur qui puise dans la file d'attente et envoie les messages."""
+        """Générateur réveillé dès qu'un producteur dépose un message dans la file."""
         log_queue = log_queues.get(job_id)
         if not log_queue: return
         try:
             while True:
-                if not log_queue.empty():
-                    data = log_queue.get()
-                    yield {"data": json.dumps(data)}
-                    
-                    if data.get("type") in ["done", "experiment_done", "error"]:
-                        break
-                await asyncio.sleep(0.1)
+                try:
+                    data = await asyncio.wait_for(log_queue.get(), timeout=30)
+                except asyncio.TimeoutError:
+                    # Message de maintien de connexion quand le job est silencieux.
+                    yield {"data": orjson.dumps({"type": "ping"}).decode("ascii")}
+                    continue
+
+                yield {"data": orjson.dumps(data).decode("ascii")}
+
+                if data.get("type") in ["done", "experiment_done", "error"]:
+                    break
         except asyncio.CancelledError:
+            # Le client est parti : plus personne ne videra la file. On marque
+            # le job abandonné (les _post suivants jettent leurs messages) et
+            # on la vide pour débloquer un producteur en attente sur put().
+            abandoned_jobs.add(job_id)
+            while not log_queue.empty():
+                log_queue.get_nowait()
             print(f"Client déconnecté pour le job {job_id}")
             raise
 
@@ -311,4 +655,8 @@ app.mount("/", StaticFiles(directory="public", html=True), name="static")
 if __name__ == "__main__":
     import uvicorn
     print("Serveur démarré. Accédez à l'application via http://127.0.0.1:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop (boucle d'événements en C) et httptools (parseur HTTP en C)
+    # réduisent nettement le coût par événement du streaming SSE. Un seul
+    # worker HTTP : l'état (log_queues, result_cache) est local au processus,
+    # le parallélisme CPU étant déjà assuré par le ProcessPoolExecutor.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -468,7 +468,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const card = document.createElement('div');
         card.className = 'result-card bg-gray-700/50 p-4 rounded-lg shadow-md flex flex-col gap-3 cursor-pointer transition-all duration-200 border-2 border-transparent';
         card.dataset.runId = data.run_index;
-        card.dataset.imageData = data.image;
+        card.dataset.imageData = data.url;
         card.dataset.paramsData = JSON.stringify(data.params);
         
         const paramList = Object.entries(data.params)
@@ -476,7 +476,7 @@ document.addEventListener('DOMContentLoaded', () => {
             .join('');
 
         card.innerHTML = `
-            <img src="${data.image}" class="w-full h-auto object-contain rounded-md bg-black pointer-events-none">
+            <img src="${data.url}" class="w-full h-auto object-contain rounded-md bg-black pointer-events-none">
             <ul class="text-xs space-y-1 text-gray-400 mt-2 pointer-events-none">
                 ${paramList}
             </ul>
@@ -6,9 +6,18 @@ import argparse
 import os
 import time
 import csv
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count, get_context
 from tqdm import tqdm
 
+# Un seul thread natif par worker : le parallélisme vient du Pool, et
+# workers x threads BLAS/OpenMP sursouscrirait les cœurs. Doit être fait
+# avant l'import de numpy/numba pour être pris en compte partout.
+for _var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMBA_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+# Couche de threads fork-safe : avec TBB, le parent (qui a compilé les noyaux
+# numba à l'import) reste bloqué sur un futex à la sortie après un Pool fork().
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
+
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -17,18 +26,52 @@ from src.dark_channel_prior import utils
 from src.dark_channel_prior import io
 from src.dark_channel_prior import runner
 
+def estimate_task_cost(config: dict) -> float:
+    """
+    Estime le coût relatif d'un run à partir de sa configuration.
+
+    Le proxy patch_size * radius suffit pour ordonner les runs du filtre
+    guidé ; le soft matting, bien plus coûteux, est fortement pondéré.
+
+    Args:
+        config (dict): Configuration complète du run.
+
+    Returns:
+        float: Coût estimé (sans unité, utilisé uniquement pour trier).
+    """
+    patch_size = config.get('algorithm', {}).get('patch_size', 15)
+    radius = config.get('refinement', {}).get('guided_filter', {}).get('radius', 60)
+    cost = float(patch_size * radius)
+    if config.get('refinement', {}).get('method') in ('soft_matting', 'all'):
+        cost *= 1000.0
+    return cost
+
+
+# Image brumeuse décodée une seule fois dans le parent ; les workers forkés
+# la lisent en copy-on-write sans la redécoder ni la sérialiser.
+_HAZY_IMAGE = None
+
+
+def init_worker():
+    """
+    Initialisation exécutée une fois par processus worker : réapplique le
+    plafond d'un thread par bibliothèque native (ceinture et bretelles, les
+    variables étant déjà héritées du parent via fork).
+    """
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMBA_NUM_THREADS'):
+        os.environ[var] = '1'
+
+
 def worker_process(args: tuple):
     """
     Fonction exécutée par chaque processus worker.
 
     Args:
-        args (tuple): Un tuple contenant (image_path, config, output_dir).
+        args (tuple): Un tuple contenant (config, output_dir).
     """
-    image_path, config, output_dir = args
+    config, output_dir = args
     try:
-        hazy_image = io.read_image(image_path)
-        if hazy_image is not None:
-            runner.process_single_image(hazy_image, config, output_dir)
+        runner.process_single_image(_HAZY_IMAGE, config, output_dir)
         return output_dir, "Success", ""
     except Exception as e:
         print(f"Erreur dans le worker pour {output_dir}: {e}")
@@ -76,37 +119,49 @@ def main():
     # --- 2. Génération des configurations pour chaque test ---
     tasks = []
     configs_to_run = utils.generate_experiment_configs(exp_config)
-    print(configs_to_run, type(configs_to_run))
-    
+
     image_path = exp_config['image_path']
     if not os.path.exists(image_path):
         print(f"ERREUR: L'image d'entrée '{image_path}' est introuvable.")
         return
 
+    # Décodage unique dans le parent : tous les runs partagent la même image.
+    global _HAZY_IMAGE
+    _HAZY_IMAGE = io.read_image(image_path)
+    if _HAZY_IMAGE is None:
+        return
+
     for run_name, run_config in configs_to_run:
         run_output_dir = os.path.join(experiment_root_dir, run_name)
         os.makedirs(run_output_dir, exist_ok=True)
-        tasks.append((image_path, run_config, run_output_dir))
+        tasks.append((run_config, run_output_dir))
 
-    print(f"{len(tasks)} combinaisons de paramètres à tester avec {args.workers} workers.")
+    # Les tâches les plus coûteuses d'abord : avec des coûts hétérogènes,
+    # cela évite qu'un gros run démarre en dernier et laisse les autres
+    # workers inactifs en fin d'expérience.
+    tasks.sort(key=lambda task: estimate_task_cost(task[0]), reverse=True)
 
-    # --- 3. Exécution des tâches en parallèle ---
-    results = []
-    with Pool(processes=args.workers) as pool:
-        with tqdm(total=len(tasks), desc="Progression de l'expérience") as pbar:
-            for result in pool.imap_unordered(worker_process, tasks):
-                results.append(result)
-                pbar.update()
+    print(f"{len(tasks)} combinaisons de paramètres à tester avec {args.workers} workers.")
 
-    # --- 4. Sauvegarde du compte-rendu de l'expérience ---
+    # --- 3. Exécution des tâches en parallèle, compte-rendu écrit au fil de l'eau ---
+    # chunksize=1 : ordonnancement dynamique, un run à la fois par worker,
+    # pour ne pas regrouper des runs de coûts très différents.
+    # Le démarrage "fork" garantit que les workers héritent de _HAZY_IMAGE
+    # en copy-on-write (aucune copie tant que l'image n'est pas modifiée).
+    # Chaque ligne du résumé est écrite (et flushée) dès l'arrivée du résultat :
+    # une expérience interrompue conserve les runs déjà terminés.
     summary_path = os.path.join(experiment_root_dir, 'summary.csv')
     with open(summary_path, 'w', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(['run_name', 'status', 'error_message', 'output_path'])
-        
-        for output_dir, status, error in sorted(results):
-             run_name = os.path.basename(output_dir)
-             writer.writerow([run_name, status, error, output_dir])
+
+        with get_context('fork').Pool(processes=args.workers, initializer=init_worker) as pool:
+            with tqdm(total=len(tasks), desc="Progression de l'expérience") as pbar:
+                for output_dir, status, error in pool.imap_unordered(worker_process, tasks, chunksize=1):
+                    run_name = os.path.basename(output_dir)
+                    writer.writerow([run_name, status, error, output_dir])
+                    f.flush()
+                    pbar.update()
 
     end_time = time.time()
     print("\nExpérience terminée.")
@@ -2,11 +2,172 @@
 Implémentation de l'algorithme "Dark Channel Prior".
 """
 
+import os
+
+# Couche de threads workqueue (fork-safe) : la pré-compilation en fin de module
+# initialise la couche dans le processus qui importe, et TBB laisse ensuite un
+# parent utilisant un Pool fork() bloqué sur un futex à l'arrêt de l'interpréteur.
+os.environ.setdefault('NUMBA_THREADING_LAYER', 'workqueue')
+
+import cv2
 import numpy as np
-import scipy.ndimage as ndimage
-from scipy.sparse import lil_matrix, identity
+from numba import njit, prange
+from scipy.sparse import coo_matrix, diags, identity
 from scipy.sparse.linalg import cg
-from tqdm import tqdm
+
+
+@njit(cache=True)
+def _top_k_brightest(image: np.ndarray, dark_channel: np.ndarray, k: int) -> np.ndarray:
+    """
+    Sélectionne, en une seule passe sur le canal sombre, le pixel de plus
+    forte intensité (R+G+B) parmi les k pixels au canal sombre le plus élevé.
+
+    Un tas-min de taille k remplace le couple argpartition + gather : O(N log k)
+    sans tableau aplati ni indexation avancée intermédiaires.
+    """
+    h, w = dark_channel.shape
+    heap_vals = np.empty(k, dtype=np.float32)
+    heap_idx = np.empty(k, dtype=np.int64)
+    n = 0
+    for i in range(h):
+        for j in range(w):
+            v = dark_channel[i, j]
+            if n < k:
+                # Insertion : remontée dans le tas
+                heap_vals[n] = v
+                heap_idx[n] = i * w + j
+                c = n
+                n += 1
+                while c > 0:
+                    p = (c - 1) // 2
+                    if heap_vals[c] < heap_vals[p]:
+                        heap_vals[c], heap_vals[p] = heap_vals[p], heap_vals[c]
+                        heap_idx[c], heap_idx[p] = heap_idx[p], heap_idx[c]
+                        c = p
+                    else:
+                        break
+            elif v > heap_vals[0]:
+                # Remplacement de la racine : descente dans le tas
+                heap_vals[0] = v
+                heap_idx[0] = i * w + j
+                c = 0
+                while True:
+                    left = 2 * c + 1
+                    right = left + 1
+                    smallest = c
+                    if left < k and heap_vals[left] < heap_vals[smallest]:
+                        smallest = left
+                    if right < k and heap_vals[right] < heap_vals[smallest]:
+                        smallest = right
+                    if smallest == c:
+                        break
+                    heap_vals[c], heap_vals[smallest] = heap_vals[smallest], heap_vals[c]
+                    heap_idx[c], heap_idx[smallest] = heap_idx[smallest], heap_idx[c]
+                    c = smallest
+
+    best_idx = 0
+    best_sum = np.float32(-1.0)
+    for t in range(n):
+        idx = heap_idx[t]
+        i = idx // w
+        j = idx % w
+        s = image[i, j, 0] + image[i, j, 1] + image[i, j, 2]
+        if s > best_sum:
+            best_sum = s
+            best_idx = idx
+
+    out = np.empty(3, dtype=np.float32)
+    i = best_idx // w
+    j = best_idx % w
+    out[0] = image[i, j, 0]
+    out[1] = image[i, j, 1]
+    out[2] = image[i, j, 2]
+    return out
+
+
+@njit(fastmath=True, cache=True)
+def _vhgw_min_1d(buf: np.ndarray, prefix: np.ndarray, suffix: np.ndarray,
+                 out_line: np.ndarray, n_out: int, patch_size: int) -> None:
+    """
+    Filtre minimum 1D de Van Herk / Gil-Werman : minima préfixes et suffixes
+    par blocs de taille `patch_size`, puis min de deux lectures par pixel.
+    Coût O(1) par pixel, indépendant de la taille de la fenêtre.
+    `buf` doit être pré-rempli (bords répliqués) sur un multiple de `patch_size`.
+    """
+    n_pad = buf.shape[0]
+    for start in range(0, n_pad, patch_size):
+        end = start + patch_size
+        m = buf[start]
+        prefix[start] = m
+        for x in range(start + 1, end):
+            if buf[x] < m:
+                m = buf[x]
+            prefix[x] = m
+        m = buf[end - 1]
+        suffix[end - 1] = m
+        for x in range(end - 2, start - 1, -1):
+            if buf[x] < m:
+                m = buf[x]
+            suffix[x] = m
+    span = patch_size - 1
+    for j in range(n_out):
+        a = suffix[j]
+        b = prefix[j + span]
+        out_line[j] = a if a < b else b
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _dark_channel_min(image: np.ndarray, patch_size: int, inv_light: np.ndarray) -> np.ndarray:
+    """
+    Canal sombre fusionné : minimum sur les 3 canaux de l'image multipliée par
+    `inv_light` (1/A, ou des 1 pour le canal sombre brut), calculé directement
+    dans la passe lignes du filtre minimum de Van Herk / Gil-Werman — aucun
+    tableau intermédiaire (h, w) entre les deux étapes.
+    """
+    h, w, _ = image.shape
+    radius = patch_size // 2
+    a0 = np.float32(inv_light[0])
+    a1 = np.float32(inv_light[1])
+    a2 = np.float32(inv_light[2])
+
+    n_pad_w = ((w + 2 * radius + patch_size - 1) // patch_size) * patch_size
+    row_min = np.empty((h, w), dtype=np.float32)
+    for i in prange(h):
+        buf = np.empty(n_pad_w, dtype=np.float32)
+        prefix = np.empty(n_pad_w, dtype=np.float32)
+        suffix = np.empty(n_pad_w, dtype=np.float32)
+        for j in range(w):
+            m = image[i, j, 0] * a0
+            v = image[i, j, 1] * a1
+            if v < m:
+                m = v
+            v = image[i, j, 2] * a2
+            if v < m:
+                m = v
+            buf[radius + j] = m
+        for j in range(radius):
+            buf[j] = buf[radius]
+        for j in range(radius + w, n_pad_w):
+            buf[j] = buf[radius + w - 1]
+        _vhgw_min_1d(buf, prefix, suffix, row_min[i], w, patch_size)
+
+    n_pad_h = ((h + 2 * radius + patch_size - 1) // patch_size) * patch_size
+    out = np.empty((h, w), dtype=np.float32)
+    for j in prange(w):
+        buf = np.empty(n_pad_h, dtype=np.float32)
+        prefix = np.empty(n_pad_h, dtype=np.float32)
+        suffix = np.empty(n_pad_h, dtype=np.float32)
+        line = np.empty(h, dtype=np.float32)
+        for i in range(radius):
+            buf[i] = row_min[0, j]
+        for i in range(h):
+            buf[radius + i] = row_min[i, j]
+        for i in range(radius + h, n_pad_h):
+            buf[i] = row_min[h - 1, j]
+        _vhgw_min_1d(buf, prefix, suffix, line, h, patch_size)
+        for i in range(h):
+            out[i, j] = line[i]
+    return out
 
 
 def get_dark_channel(image: np.ndarray, patch_size: int) -> np.ndarray:
@@ -23,12 +184,10 @@ def get_dark_channel(image: np.ndarray, patch_size: int) -> np.ndarray:
     """
     if patch_size % 2 == 0:
         raise ValueError("La taille du patch (patch_size) doit être un entier impair.")
-    
-    min_channel_img = np.min(image, axis=2)
-    
-    dark_channel = ndimage.minimum_filter(min_channel_img, size=patch_size)
-    
-    return dark_channel
+
+    image = np.ascontiguousarray(image, dtype=np.float32)
+
+    return _dark_channel_min(image, patch_size, np.ones(3, dtype=np.float32))
 
 
 def estimate_atmospheric_light(hazy_image: np.ndarray, dark_channel: np.ndarray, percentile: float) -> np.ndarray:
@@ -44,20 +203,14 @@ def estimate_atmospheric_light(hazy_image: np.ndarray, dark_channel: np.ndarray,
         np.ndarray: Lumière atmosphérique (A) sous forme d'un vecteur RGB. Shape: (3,).
     """
     total_pixels = dark_channel.size
-    num_brightest = int(total_pixels * percentile)
-    
-    flat_dark_channel = dark_channel.flatten()
-    indices = np.argpartition(flat_dark_channel, -num_brightest)[-num_brightest:]
-    
-    coords = np.unravel_index(indices, dark_channel.shape)
-    
-    candidate_pixels = hazy_image[coords]
-    
-    brightest_idx = np.argmax(np.sum(candidate_pixels, axis=1))
-    
-    atmospheric_light = candidate_pixels[brightest_idx]
-    
-    return atmospheric_light
+    # Au moins un pixel : pour une petite image ou un percentile très faible,
+    # int(total * percentile) peut valoir 0.
+    num_brightest = max(1, int(total_pixels * percentile))
+
+    hazy_image = np.ascontiguousarray(hazy_image, dtype=np.float32)
+    dark_channel = np.ascontiguousarray(dark_channel, dtype=np.float32)
+
+    return _top_k_brightest(hazy_image, dark_channel, num_brightest)
 
 
 def estimate_initial_transmission(hazy_image: np.ndarray, atmospheric_light: np.ndarray, patch_size: int, omega: float) -> np.ndarray:
@@ -74,10 +227,17 @@ def estimate_initial_transmission(hazy_image: np.ndarray, atmospheric_light: np.
     Returns:
         np.ndarray: Carte de transmission initiale. Shape: (hauteur, largeur).
     """
-    hazy_image_norm = hazy_image / atmospheric_light
-    
-    transmission = 1 - omega * get_dark_channel(hazy_image_norm, patch_size)
-    
+    if patch_size % 2 == 0:
+        raise ValueError("La taille du patch (patch_size) doit être un entier impair.")
+
+    hazy_image = np.ascontiguousarray(hazy_image, dtype=np.float32)
+    atmospheric_light = np.asarray(atmospheric_light, dtype=np.float32)
+
+    inv_light = np.float32(1.0) / atmospheric_light
+    dark_channel_norm = _dark_channel_min(hazy_image, patch_size, inv_light)
+
+    transmission = 1 - omega * dark_channel_norm
+
     return transmission
 
 
@@ -100,91 +260,149 @@ def refine_transmission_soft_matting(initial_transmission: np.ndarray, hazy_imag
         raise ValueError("La taille de la fenêtre (win_size) doit être un entier impair.")
 
     epsilon = float(epsilon)
+    hazy_image = np.ascontiguousarray(hazy_image, dtype=np.float64)
     h, w, _ = hazy_image.shape
     img_size = h * w
-
-    matting_laplacian = lil_matrix((img_size, img_size))
-
-    U3 = np.identity(3)
-    indices_map = np.arange(img_size).reshape(h, w)
-    win_radius = win_size // 2
-
-    print("\nConstruction de la matrice Laplacienne de Matting (cela peut prendre du temps)...")
-    for y in tqdm(range(h), desc="Matting Laplacian"):
-        for x in range(w):
-            y_min, y_max = max(0, y - win_radius), min(h, y + win_radius + 1)
-            x_min, x_max = max(0, x - win_radius), min(w, x + win_radius + 1)
-            
-            win_pixels = hazy_image[y_min:y_max, x_min:x_max].reshape(-1, 3)
-            win_indices = indices_map[y_min:y_max, x_min:x_max].flatten()
-            
-            win_area = len(win_pixels)
-            if win_area == 0:
-                continue
-
-            # mu_k et Sigma_k de l'éq. 14
-            mean_k = np.mean(win_pixels, axis=0)
-            win_pixels_centered = win_pixels - mean_k
-            cov_k = (win_pixels_centered.T @ win_pixels_centered) / win_area
-
-            # Terme d'inversion de l'éq. 14
-            inv_term = np.linalg.inv(cov_k + (epsilon / win_area) * U3)
-
-            for i_idx, i in enumerate(win_indices):
-                for j_idx, j in enumerate(win_indices):
-                    term = win_pixels_centered[i_idx].reshape(1, 3) @ inv_term @ win_pixels_centered[j_idx].reshape(3, 1)
-                    val = (1 + term[0, 0]) / win_area
-                    
-                    if i == j:
-                        matting_laplacian[i, j] += 1 - val
-                    else:
-                        matting_laplacian[i, j] -= val
+    win_area = win_size * win_size
+
+    # Assemblage vectorisé du Laplacien de Matting (forme close de Levin) :
+    # toutes les fenêtres (entièrement intérieures) sont traitées d'un bloc,
+    # avec inversions 3x3 groupées, au lieu d'une boucle Python par pixel.
+    print("\nConstruction de la matrice Laplacienne de Matting...")
+    indices_map = np.arange(img_size, dtype=np.int32).reshape(h, w)
+    win_indices = np.lib.stride_tricks.sliding_window_view(
+        indices_map, (win_size, win_size)
+    ).reshape(-1, win_area)
+    win_pixels = hazy_image.reshape(-1, 3)[win_indices]
+
+    # mu_k et Sigma_k de l'éq. 14, pour toutes les fenêtres à la fois
+    mean_k = win_pixels.mean(axis=1, keepdims=True)
+    win_pixels_centered = win_pixels - mean_k
+    cov_k = np.einsum('nwi,nwj->nij', win_pixels_centered, win_pixels_centered) / win_area
+
+    # Terme d'inversion de l'éq. 14 (inversion groupée des matrices 3x3)
+    inv_term = np.linalg.inv(cov_k + (epsilon / win_area) * np.identity(3))
+
+    # (1 + (I_i - mu)^T inv (I_j - mu)) / |w| pour chaque paire (i, j) de chaque fenêtre
+    projected = np.einsum('nwi,nij->nwj', win_pixels_centered, inv_term)
+    vals = (1.0 + np.einsum('nwi,nvi->nwv', projected, win_pixels_centered)) / win_area
+
+    rows = np.repeat(win_indices, win_area, axis=1).ravel()
+    cols = np.tile(win_indices, (1, win_area)).ravel()
+
+    # L_ij = somme_k [ delta_ij - vals ] : le terme delta vaut, sur la diagonale,
+    # le nombre de fenêtres contenant le pixel.
+    matting_laplacian = coo_matrix((-vals.ravel(), (rows, cols)), shape=(img_size, img_size))
+    window_counts = np.bincount(win_indices.ravel(), minlength=img_size)
+    matting_laplacian = (matting_laplacian + diags(window_counts.astype(np.float64))).tocsr()
 
     # Résolution du système linéaire (L + lambda * U) * t = lambda * t_tilde (Éq. 15)
     print("Résolution du système linéaire...")
     U = identity(img_size, format='csr')
-    A_mat = matting_laplacian.tocsr() + lambda_param * U
+    A_mat = matting_laplacian + lambda_param * U
     b_vec = lambda_param * initial_transmission.flatten()
 
-    # Utilisation du solveur de gradient conjugué (PCG), comme suggéré dans l'article
-    refined_t_flat, _ = cg(A_mat, b_vec, rtol=1e-6, maxiter=2000)
+    # Utilisation du solveur de gradient conjugué (PCG), comme suggéré dans l'article.
+    # Préconditionneur de Jacobi : l'inverse de la diagonale rééquilibre le
+    # conditionnement du Laplacien et réduit nettement le nombre d'itérations.
+    jacobi_preconditioner = diags(1.0 / A_mat.diagonal())
+    refined_t_flat, _ = cg(A_mat, b_vec, rtol=1e-6, maxiter=2000, M=jacobi_preconditioner)
 
     refined_transmission = refined_t_flat.reshape(h, w)
     
     return np.clip(refined_transmission, 0, 1)
 
 
-def refine_transmission_guided_filter(transmission: np.ndarray, hazy_image_gray: np.ndarray, radius: int, epsilon: float) -> np.ndarray:
+def compute_guide_integrals(hazy_image_gray: np.ndarray) -> tuple:
+    """
+    Précalcule le guide en float32 et son carré pour le filtre guidé.
+
+    Ces tableaux ne dépendent que du guide : ils peuvent être réutilisés
+    entre plusieurs appels à `refine_transmission_guided_filter` sur la même
+    image (par exemple lors d'un balayage de paramètres).
+
+    Args:
+        hazy_image_gray (np.ndarray): Image guide en niveaux de gris (0-1).
+
+    Returns:
+        tuple: (I, I*I), le guide et son carré, en float32.
+    """
+    hazy_image_gray = hazy_image_gray.astype(np.float32, copy=False)
+    return hazy_image_gray, hazy_image_gray * hazy_image_gray
+
+
+def refine_transmission_guided_filter(transmission: np.ndarray, hazy_image_gray: np.ndarray, radius: int, epsilon: float, guide_integrals: tuple = None) -> np.ndarray:
     """
     Affine la carte de transmission en utilisant un Filtre Guidé (basé sur le papier "Guided Image Filtering").
 
+    Les moyennes locales sont calculées par `cv2.boxFilter` (sommes glissantes
+    SIMD) : le coût par pixel est constant quel que soit le rayon.
+
     Args:
         transmission (np.ndarray): Carte de transmission initiale.
         hazy_image_gray (np.ndarray): Image brumeuse en niveaux de gris (0-1), utilisée comme guide.
         radius (int): Rayon du filtre.
         epsilon (float): Paramètre de régularisation.
+        guide_integrals (tuple, optional): Guide et son carré (I, I*I)
+                                           précalculés via `compute_guide_integrals`.
 
     Returns:
         np.ndarray: Carte de transmission affinée.
     """
-    mean_I = ndimage.uniform_filter(hazy_image_gray, size=radius)
-    mean_p = ndimage.uniform_filter(transmission, size=radius)
-    corr_I = ndimage.uniform_filter(hazy_image_gray * hazy_image_gray, size=radius)
-    corr_Ip = ndimage.uniform_filter(hazy_image_gray * transmission, size=radius)
-    
+    transmission = transmission.astype(np.float32, copy=False)
+    hazy_image_gray = hazy_image_gray.astype(np.float32, copy=False)
+
+    if guide_integrals is None:
+        guide_integrals = compute_guide_integrals(hazy_image_gray)
+    guide, guide_sq = guide_integrals
+
+    ksize = (radius, radius)
+    mean_I = cv2.boxFilter(guide, -1, ksize)
+    mean_p = cv2.boxFilter(transmission, -1, ksize)
+    corr_I = cv2.boxFilter(guide_sq, -1, ksize)
+    corr_Ip = cv2.boxFilter(guide * transmission, -1, ksize)
+
     var_I = corr_I - mean_I * mean_I
     cov_Ip = corr_Ip - mean_I * mean_p
-    
+
     a = cov_Ip / (var_I + epsilon)
     b = mean_p - a * mean_I
-    
-    mean_a = ndimage.uniform_filter(a, size=radius)
-    mean_b = ndimage.uniform_filter(b, size=radius)
-    
-    refined_transmission = mean_a * hazy_image_gray + mean_b
+
+    mean_a = cv2.boxFilter(a, -1, ksize)
+    mean_b = cv2.boxFilter(b, -1, ksize)
+
+    refined_transmission = mean_a * guide + mean_b
     return np.clip(refined_transmission, 0, 1)
 
 
+@njit(parallel=True, fastmath=True, cache=True)
+def _recover_radiance(hazy_image: np.ndarray, atmospheric_light: np.ndarray,
+                      transmission: np.ndarray, t0: float) -> np.ndarray:
+    """
+    Noyau fusionné de l'éq. 16 : clampe t, soustrait A, divise, rajoute A et
+    clippe dans [0, 1] en une seule passe, sans tableau (h, w, 3) intermédiaire.
+    """
+    h, w, _ = hazy_image.shape
+    a0 = np.float32(atmospheric_light[0])
+    a1 = np.float32(atmospheric_light[1])
+    a2 = np.float32(atmospheric_light[2])
+    t0_f = np.float32(t0)
+    out = np.empty((h, w, 3), dtype=np.float32)
+    for i in prange(h):
+        for j in range(w):
+            t = transmission[i, j]
+            if t < t0_f:
+                t = t0_f
+            inv_t = np.float32(1.0) / t
+            v = (hazy_image[i, j, 0] - a0) * inv_t + a0
+            out[i, j, 0] = min(max(v, np.float32(0.0)), np.float32(1.0))
+            v = (hazy_image[i, j, 1] - a1) * inv_t + a1
+            out[i, j, 1] = min(max(v, np.float32(0.0)), np.float32(1.0))
+            v = (hazy_image[i, j, 2] - a2) * inv_t + a2
+            out[i, j, 2] = min(max(v, np.float32(0.0)), np.float32(1.0))
+    return out
+
+
 def recover_scene_radiance(hazy_image: np.ndarray, atmospheric_light: np.ndarray, transmission: np.ndarray, t0: float) -> np.ndarray:
     """
     Récupère l'image sans brume (radiance de la scène).
@@ -199,10 +417,21 @@ def recover_scene_radiance(hazy_image: np.ndarray, atmospheric_light: np.ndarray
     Returns:
         np.ndarray: Image sans brume (RGB, 0-1).
     """
-    transmission_3d = np.expand_dims(transmission, axis=2)
-    
-    transmission_clamped = np.maximum(transmission_3d, t0)
-    
-    scene_radiance = (hazy_image - atmospheric_light) / transmission_clamped + atmospheric_light
-    
-    return np.clip(scene_radiance, 0, 1)
\ No newline at end of file
+    hazy_image = np.ascontiguousarray(hazy_image, dtype=np.float32)
+    atmospheric_light = np.asarray(atmospheric_light, dtype=np.float32)
+    transmission = np.ascontiguousarray(transmission, dtype=np.float32)
+
+    return _recover_radiance(hazy_image, atmospheric_light, transmission, t0)
+
+
+def _warmup_kernels():
+    """Déclenche la compilation JIT des noyaux Numba à l'import (coût amorti)."""
+    dummy = np.zeros((8, 8, 3), dtype=np.float32)
+    ones = np.ones(3, dtype=np.float32)
+    _dark_channel_min(dummy, 3, ones)
+    dummy_2d = np.zeros((8, 8), dtype=np.float32)
+    _top_k_brightest(dummy, dummy_2d, 4)
+    _recover_radiance(dummy, ones, dummy_2d, 0.1)
+
+
+_warmup_kernels()
\ No newline at end of file
@@ -25,7 +25,12 @@ def run_haze_removal_pipeline(
     """
     
     log_callback("Début du traitement...", None)
-    
+
+    # Normalisation unique de la disposition mémoire : float32 contigu (H, W, 3).
+    # Les noyaux fusionnés lisent les 3 canaux d'un pixel dans la même ligne de
+    # cache ; les étapes suivantes n'ont plus aucune conversion à faire.
+    hazy_image = np.ascontiguousarray(hazy_image, dtype=np.float32)
+
     alg_config = config['algorithm']
     ref_config = config['refinement']
 
@@ -74,7 +79,8 @@ def run_haze_removal_pipeline(
 
 def process_image_for_experiment(
     hazy_image: np.ndarray,
-    config: Dict[str, Any]
+    config: Dict[str, Any],
+    hazy_gray: Optional[np.ndarray] = None
 ) -> np.ndarray:
     """
     Exécute une version optimisée du pipeline retournant uniquement l'image finale.
@@ -83,10 +89,21 @@ def process_image_for_experiment(
     Args:
         hazy_image (np.ndarray): L'image brumeuse d'entrée (float 0-1).
         config (Dict[str, Any]): Dictionnaire de configuration pour ce run.
+        hazy_gray (Optional[np.ndarray]): Version en niveaux de gris de l'image,
+                                          si déjà calculée (elle ne dépend que de
+                                          l'image : un worker qui enchaîne les runs
+                                          sur la même image peut la réutiliser).
 
     Returns:
         np.ndarray: L'image finale débruitée (float 0-1).
     """
+    if config.get('backend') == 'cupy':
+        # Import paresseux : CuPy et un GPU ne sont requis que pour ce backend.
+        from . import gpu
+        return gpu.process_image_for_experiment(hazy_image, config)
+
+    hazy_image = np.ascontiguousarray(hazy_image, dtype=np.float32)
+
     alg_config = config['algorithm']
     ref_config = config['refinement']
 
@@ -101,8 +118,9 @@ def process_image_for_experiment(
     )
     
     gf_config = ref_config['guided_filter']
-    hazy_gray = prep.convert_to_grayscale(hazy_image)
-    
+    if hazy_gray is None:
+        hazy_gray = prep.convert_to_grayscale(hazy_image)
+
     refined_transmission = alg.refine_transmission_guided_filter(
         initial_transmission, hazy_gray, gf_config['radius'], gf_config['epsilon']
     )
@@ -0,0 +1,105 @@
+"""
+Implémentation GPU (CuPy) du pipeline pour le mode expérimental.
+
+Ce module n'est importé que si un run demande `backend: "cupy"` : CuPy (et
+un GPU CUDA) ne sont donc nécessaires que dans ce cas. Toutes les étapes du
+pipeline étant parallèles par pixel, elles se transposent directement sur
+leurs équivalents `cupy` / `cupyx.scipy.ndimage`.
+"""
+
+import numpy as np
+import cupy as cp
+from cupyx.scipy import ndimage as cp_ndimage
+
+
+def _get_dark_channel(image: cp.ndarray, patch_size: int) -> cp.ndarray:
+    """Canal sombre sur GPU : min sur les canaux puis filtre minimum 2D."""
+    return cp_ndimage.minimum_filter(cp.min(image, axis=2), size=patch_size)
+
+
+def _estimate_atmospheric_light(hazy_image: cp.ndarray, dark_channel: cp.ndarray, percentile: float) -> cp.ndarray:
+    """Lumière atmosphérique : pixel le plus brillant parmi le top du canal sombre."""
+    num_brightest = max(1, int(dark_channel.size * percentile))
+    indices = cp.argpartition(dark_channel.ravel(), -num_brightest)[-num_brightest:]
+    candidate_pixels = hazy_image.reshape(-1, 3)[indices]
+    return candidate_pixels[cp.argmax(candidate_pixels.sum(axis=1))]
+
+
+def _estimate_initial_transmission(hazy_image: cp.ndarray, atmospheric_light: cp.ndarray,
+                                   patch_size: int, omega: float) -> cp.ndarray:
+    """Transmission initiale (éq. 12) sur GPU."""
+    return 1 - omega * _get_dark_channel(hazy_image / atmospheric_light, patch_size)
+
+
+def _refine_transmission_guided_filter(transmission: cp.ndarray, hazy_gray: cp.ndarray,
+                                       radius: int, epsilon: float) -> cp.ndarray:
+    """Filtre guidé sur GPU via des filtres moyenneurs cupyx."""
+    mean_I = cp_ndimage.uniform_filter(hazy_gray, size=radius)
+    mean_p = cp_ndimage.uniform_filter(transmission, size=radius)
+    corr_I = cp_ndimage.uniform_filter(hazy_gray * hazy_gray, size=radius)
+    corr_Ip = cp_ndimage.uniform_filter(hazy_gray * transmission, size=radius)
+
+    var_I = corr_I - mean_I * mean_I
+    cov_Ip = corr_Ip - mean_I * mean_p
+
+    a = cov_Ip / (var_I + epsilon)
+    b = mean_p - a * mean_I
+
+    mean_a = cp_ndimage.uniform_filter(a, size=radius)
+    mean_b = cp_ndimage.uniform_filter(b, size=radius)
+
+    return cp.clip(mean_a * hazy_gray + mean_b, 0, 1)
+
+
+def _recover_scene_radiance(hazy_image: cp.ndarray, atmospheric_light: cp.ndarray,
+                            transmission: cp.ndarray, t0: float) -> cp.ndarray:
+    """Radiance de la scène (éq. 16) sur GPU."""
+    transmission_clamped = cp.maximum(transmission[:, :, None], t0)
+    scene_radiance = (hazy_image - atmospheric_light) / transmission_clamped + atmospheric_light
+    return cp.clip(scene_radiance, 0, 1)
+
+
+def process_image_for_experiment(hazy_image: np.ndarray, config: dict, return_maps: bool = False):
+    """
+    Exécute le pipeline complet sur GPU et retourne l'image finale sur l'hôte.
+
+    Args:
+        hazy_image (np.ndarray): L'image brumeuse d'entrée (float 0-1).
+        config (dict): Dictionnaire de configuration pour ce run.
+        return_maps (bool): Si True, retourne aussi les transmissions initiale
+                            et affinée (pour les artéfacts du runner).
+
+    Returns:
+        np.ndarray: L'image finale débruitée (float32 0-1, sur CPU), ou le
+                    triplet (image finale, transmission initiale, transmission
+                    affinée) si return_maps est True.
+    """
+    alg_config = config['algorithm']
+    gf_config = config['refinement']['guided_filter']
+
+    hazy_gpu = cp.asarray(hazy_image, dtype=cp.float32)
+
+    dark_channel = _get_dark_channel(hazy_gpu, alg_config['patch_size'])
+    atmospheric_light = _estimate_atmospheric_light(
+        hazy_gpu, dark_channel, alg_config['atmospheric_light_percentile']
+    )
+    initial_transmission = _estimate_initial_transmission(
+        hazy_gpu, atmospheric_light, alg_config['patch_size'], alg_config['omega']
+    )
+
+    hazy_gray = hazy_gpu @ cp.asarray([0.2989, 0.5870, 0.1140], dtype=cp.float32)
+    refined_transmission = _refine_transmission_guided_filter(
+        initial_transmission, hazy_gray, gf_config['radius'], gf_config['epsilon']
+    )
+
+    scene_radiance = _recover_scene_radiance(
+        hazy_gpu, atmospheric_light, refined_transmission, alg_config['t0']
+    )
+
+    if return_maps:
+        return (
+            cp.asnumpy(scene_radiance),
+            cp.asnumpy(initial_transmission),
+            cp.asnumpy(refined_transmission),
+        )
+    return cp.asnumpy(scene_radiance)
@@ -2,14 +2,33 @@
 Fonctions pour la lecture et l'écriture d'images.
 """
 
+import hashlib
+import os
+
 import numpy as np
 from PIL import Image
 from typing import Optional
 
+# Cache de décodage en tmpfs : le premier read_image décode et dépose le
+# tableau en .npy dans /dev/shm ; les lectures suivantes (autres runs, autres
+# processus) le récupèrent par simple mmap, sans décodage ni accès disque.
+_SHM_CACHE_DIR = '/dev/shm'
+
+
+def _decode_cache_path(image_path: str, mtime: float) -> str:
+    """Chemin du .npy en cache pour un fichier image (clé : chemin + mtime)."""
+    key = hashlib.sha1(f"{os.path.abspath(image_path)}:{mtime}".encode()).hexdigest()
+    return os.path.join(_SHM_CACHE_DIR, f"haze_{key}.npy")
+
+
 def read_image(image_path: str) -> Optional[np.ndarray]:
     """
     Lit une image depuis un fichier et la convertit en un tableau numpy (float, 0-1).
 
+    Le résultat du décodage est mis en cache dans /dev/shm (clé chemin + date
+    de modification) : les appels suivants sur la même image se réduisent à un
+    np.load en mmap lecture seule.
+
     Args:
         image_path (str): Chemin vers le fichier image.
 
@@ -19,11 +38,43 @@ def read_image(image_path: str) -> Optional[np.ndarray]:
                               Retourne None si le fichier n'est pas trouvé.
     """
     try:
+        cache_path = None
+        if os.path.isdir(_SHM_CACHE_DIR):
+            cache_path = _decode_cache_path(image_path, os.path.getmtime(image_path))
+            if os.path.exists(cache_path):
+                return np.load(cache_path, mmap_mode='r')
+
         img = Image.open(image_path)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        img_np = np.array(img, dtype=np.float32) / 255.0
+        if img.mode == 'RGBA':
+            # Alpha uniformément opaque (cas typique des PNG photo) : on
+            # ignore simplement le canal via une vue, sans le convert('RGB')
+            # de PIL qui retraverse toute l'image.
+            arr = np.asarray(img)
+            if arr[..., 3].min() == 255:
+                arr = arr[..., :3]
+            else:
+                arr = np.asarray(img.convert('RGB'))
+        elif img.mode != 'RGB':
+            arr = np.asarray(img.convert('RGB'))
+        else:
+            arr = np.asarray(img)
+
+        # Une seule passe uint8 -> float32 : multiplication par 1/255 écrite
+        # directement dans le tampon de sortie, sans temporaire intermédiaire.
+        img_np = np.empty(arr.shape, dtype=np.float32)
+        np.multiply(arr, np.float32(1.0 / 255.0), out=img_np)
+
+        if cache_path is not None:
+            try:
+                # Écriture atomique (fichier temporaire + rename) : des workers
+                # concurrents ne peuvent pas lire un .npy partiellement écrit.
+                tmp_path = f"{cache_path}.tmp{os.getpid()}"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, img_np)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+
         return img_np
     except FileNotFoundError:
         print(f"Erreur: Fichier image introuvable à l'adresse '{image_path}'")
@@ -33,18 +84,33 @@ def read_image(image_path: str) -> Optional[np.ndarray]:
         return None
 
 
-def save_image(image_np: np.ndarray, save_path: str):
+def save_image(image_np: np.ndarray, save_path: str, already_clipped: bool = False):
     """
     Sauvegarde un tableau numpy en tant que fichier image.
 
     Args:
         image_np (np.ndarray): Tableau numpy (float, 0-1) à sauvegarder.
         save_path (str): Chemin de destination pour l'image.
+        already_clipped (bool): Si True, le tableau est garanti dans [0, 1]
+                                (ex. sortie de recover_scene_radiance) et la
+                                passe de clip est omise.
     """
     try:
-        img_to_save = np.clip(image_np * 255.0, 0, 255).astype(np.uint8)
-        img = Image.fromarray(img_to_save)
-        img.save(save_path)
+        # Une seule traversée : clip, mise à l'échelle et arrondi réutilisent le
+        # même tampon float au lieu d'allouer un temporaire par opération.
+        if already_clipped:
+            buf = image_np * image_np.dtype.type(255.0)
+        else:
+            buf = np.clip(image_np, 0.0, 1.0)
+            np.multiply(buf, buf.dtype.type(255.0), out=buf)
+        np.rint(buf, out=buf)
+        img = Image.fromarray(buf.astype(np.uint8))
+        if save_path.lower().endswith(('.jpg', '.jpeg')):
+            # L'encodage JPEG est bien plus rapide que le PNG pour les grands
+            # artéfacts intermédiaires ; qualité 92 : perte imperceptible.
+            img.save(save_path, quality=92)
+        else:
+            img.save(save_path)
         print(f"Image sauvegardée à l'adresse : {save_path}")
     except Exception as e:
         print(f"Erreur lors de la sauvegarde de l'image à '{save_path}': {e}")
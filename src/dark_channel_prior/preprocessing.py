@@ -5,6 +5,12 @@ Dans notre projet de haze-removal, le prétraitement est minimal car l'algorithm
 
 import numpy as np
 
+# Poids NTSC standard, pré-construits en float32 : une liste Python passée à
+# np.dot serait convertie en float64 à chaque appel et promouvrait toute
+# l'image, doublant le trafic mémoire.
+_GRAYSCALE_WEIGHTS = np.array([0.2989, 0.5870, 0.1140], dtype=np.float32)
+
+
 def convert_to_grayscale(image_rgb: np.ndarray) -> np.ndarray:
     """
     Convertit une image RGB (numpy array, 0-1) en niveaux de gris.
@@ -15,4 +21,13 @@ def convert_to_grayscale(image_rgb: np.ndarray) -> np.ndarray:
     Returns:
         np.ndarray: Image en niveaux de gris.
     """
-    return np.dot(image_rgb[...,:3], [0.2989, 0.5870, 0.1140]) # Standard NTSC
+    weights = _GRAYSCALE_WEIGHTS
+    if image_rgb.dtype != np.float32:
+        # Uniquement pour les dtypes flottants : un cast des poids vers un
+        # dtype entier les tronquerait à zéro. Une image entière garde la
+        # promotion en float64 de l'implémentation d'origine.
+        if np.issubdtype(image_rgb.dtype, np.floating):
+            weights = weights.astype(image_rgb.dtype)
+        else:
+            weights = _GRAYSCALE_WEIGHTS.astype(np.float64)
+    return np.einsum('...c,c->...', image_rgb[..., :3], weights)
@@ -4,6 +4,7 @@ Module contenant le pipeline de traitement principal pour une seule image.
 
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 import numpy as np
 
@@ -12,6 +13,20 @@ from . import preprocessing as prep
 from . import visualization as vis
 from . import io
 
+# Cache par processus des étapes qui ne dépendent que de l'image et d'une
+# partie des paramètres : dans un balayage, un worker enchaîne des runs sur la
+# même image et n'a pas à recalculer le canal sombre, la lumière
+# atmosphérique, la transmission initiale ou le gris quand
+# (patch_size, percentile, omega) ne changent pas. Le tableau lui-même est
+# conservé dans le cache et comparé par identité (`is`) : un id() seul peut
+# être réutilisé par un nouveau tableau une fois l'ancien libéré.
+_stage_cache: Dict[str, Any] = {}
+
+# Les encodeurs PIL relâchent le GIL : deux threads suffisent pour recouvrir
+# l'encodage et l'écriture disque des artéfacts entre eux.
+_IO_POOL = ThreadPoolExecutor(max_workers=2)
+
+
 def process_single_image(
     hazy_image: np.ndarray,
     config: Dict[str, Any],
@@ -29,80 +44,145 @@ def process_single_image(
 
     alg_config = config.get('algorithm', {})
     ref_config = config.get('refinement', {})
+    refinement_method = ref_config.get('method', 'guided_filter')
+
+    if config.get('backend') == 'cupy':
+        # Pipeline entier sur GPU. Import paresseux : CuPy et un GPU CUDA ne
+        # sont requis que pour ce backend, qui n'implémente que le filtre guidé.
+        logging.info("Exécution du pipeline sur GPU (backend cupy).")
+        if refinement_method != 'guided_filter':
+            logging.warning(
+                f"Le backend cupy n'implémente que le filtre guidé ; méthode '{refinement_method}' ignorée."
+            )
+        from . import gpu
+        scene_radiance_gf, initial_transmission, refined_transmission_gf = (
+            gpu.process_image_for_experiment(hazy_image, config, return_maps=True)
+        )
+        results = {"Filtre Guidé": scene_radiance_gf}
+        transmissions = {"Filtre Guidé": refined_transmission_gf}
+    else:
+        # --- Étape 1: Algorithme de base (mis en cache entre runs sur la même image) ---
+        base_key = (
+            alg_config.get('patch_size', 15),
+            alg_config.get('atmospheric_light_percentile', 0.001),
+            alg_config.get('omega', 0.95),
+        )
+        if _stage_cache.get('base_image') is hazy_image and _stage_cache.get('base_key') == base_key:
+            logging.info("Étapes de base réutilisées depuis le cache du worker.")
+            dark_channel = _stage_cache['dark_channel']
+            atmospheric_light = _stage_cache['atmospheric_light']
+            initial_transmission = _stage_cache['initial_transmission']
+        else:
+            logging.info("Calcul du canal sombre...")
+            dark_channel = alg.get_dark_channel(hazy_image, alg_config.get('patch_size', 15))
 
-    # --- Étape 1: Algorithme de base ---
-    logging.info("Calcul du canal sombre...")
-    dark_channel = alg.get_dark_channel(hazy_image, alg_config.get('patch_size', 15))
+            logging.info("Estimation de la lumière atmosphérique...")
+            atmospheric_light = alg.estimate_atmospheric_light(
+                hazy_image, dark_channel, alg_config.get('atmospheric_light_percentile', 0.001)
+            )
+            logging.info(f"Lumière atmosphérique estimée (A) = {atmospheric_light}")
 
-    logging.info("Estimation de la lumière atmosphérique...")
-    atmospheric_light = alg.estimate_atmospheric_light(
-        hazy_image, dark_channel, alg_config.get('atmospheric_light_percentile', 0.001)
-    )
-    logging.info(f"Lumière atmosphérique estimée (A) = {atmospheric_light}")
+            logging.info("Estimation de la transmission initiale...")
+            initial_transmission = alg.estimate_initial_transmission(
+                hazy_image, atmospheric_light, alg_config.get('patch_size', 15), alg_config.get('omega', 0.95)
+            )
 
-    logging.info("Estimation de la transmission initiale...")
-    initial_transmission = alg.estimate_initial_transmission(
-        hazy_image, atmospheric_light, alg_config.get('patch_size', 15), alg_config.get('omega', 0.95)
-    )
+            _stage_cache['base_image'] = hazy_image
+            _stage_cache['base_key'] = base_key
+            _stage_cache['dark_channel'] = dark_channel
+            _stage_cache['atmospheric_light'] = atmospheric_light
+            _stage_cache['initial_transmission'] = initial_transmission
 
-    # --- Étape 2: Affinement et récupération ---
-    results = {}
-    transmissions = {}
-    refinement_method = ref_config.get('method', 'guided_filter')
+        # --- Étape 2: Affinement et récupération ---
+        results = {}
+        transmissions = {}
 
-    if refinement_method in ["guided_filter", "all"]:
-        logging.info("--- Affinement avec le Filtre Guidé ---")
-        gf_config = ref_config.get('guided_filter', {})
-        hazy_gray = prep.convert_to_grayscale(hazy_image)
+        if refinement_method in ["guided_filter", "all"]:
+            logging.info("--- Affinement avec le Filtre Guidé ---")
+            gf_config = ref_config.get('guided_filter', {})
+            if _stage_cache.get('gray_image') is hazy_image:
+                hazy_gray = _stage_cache['hazy_gray']
+            else:
+                hazy_gray = prep.convert_to_grayscale(hazy_image)
+                _stage_cache['gray_image'] = hazy_image
+                _stage_cache['hazy_gray'] = hazy_gray
 
-        refined_transmission_gf = alg.refine_transmission_guided_filter(
-            initial_transmission,
-            hazy_gray,
-            gf_config.get('radius', 60),
-            gf_config.get('epsilon', 1e-3)
-        )
-        scene_radiance_gf = alg.recover_scene_radiance(
-            hazy_image, atmospheric_light, refined_transmission_gf, alg_config.get('t0', 0.1)
-        )
-        results["Filtre Guidé"] = scene_radiance_gf
-        transmissions["Filtre Guidé"] = refined_transmission_gf
-
-    if refinement_method in ["soft_matting", "all"]:
-        logging.warning("L'affinement par Soft Matting est très lent et gourmand en mémoire.")
-        sm_config = ref_config.get('soft_matting', {})
-        
-        refined_transmission_sm = alg.refine_transmission_soft_matting(
-            initial_transmission,
-            hazy_image,
-            sm_config.get('lambda', 0.001),
-            sm_config.get('epsilon', 1e-7),
-            sm_config.get('win_size', 3)
-        )
-        scene_radiance_sm = alg.recover_scene_radiance(
-            hazy_image, atmospheric_light, refined_transmission_sm, alg_config.get('t0', 0.1)
-        )
-        results["Soft Matting"] = scene_radiance_sm
-        transmissions["Soft Matting"] = refined_transmission_sm
+            refined_transmission_gf = alg.refine_transmission_guided_filter(
+                initial_transmission,
+                hazy_gray,
+                gf_config.get('radius', 60),
+                gf_config.get('epsilon', 1e-3)
+            )
+            scene_radiance_gf = alg.recover_scene_radiance(
+                hazy_image, atmospheric_light, refined_transmission_gf, alg_config.get('t0', 0.1)
+            )
+            results["Filtre Guidé"] = scene_radiance_gf
+            transmissions["Filtre Guidé"] = refined_transmission_gf
+
+        if refinement_method in ["soft_matting", "all"]:
+            logging.warning("L'affinement par Soft Matting est très lent et gourmand en mémoire.")
+            sm_config = ref_config.get('soft_matting', {})
+
+            refined_transmission_sm = alg.refine_transmission_soft_matting(
+                initial_transmission,
+                hazy_image,
+                sm_config.get('lambda', 0.001),
+                sm_config.get('epsilon', 1e-7),
+                sm_config.get('win_size', 3)
+            )
+            scene_radiance_sm = alg.recover_scene_radiance(
+                hazy_image, atmospheric_light, refined_transmission_sm, alg_config.get('t0', 0.1)
+            )
+            results["Soft Matting"] = scene_radiance_sm
+            transmissions["Soft Matting"] = refined_transmission_sm
 
     # --- Étape 3: Sauvegarde des résultats ---
     logging.info("Sauvegarde des résultats...")
     
     figures_dir = os.path.join(output_dir, "figures")
     os.makedirs(figures_dir, exist_ok=True)
-    
-    io.save_image(initial_transmission, os.path.join(figures_dir, "transmission_initial.png"))
+
+    # JPEG par défaut pour les artéfacts intermédiaires (encodage bien plus
+    # rapide que le PNG) ; `output.format: "png"` pour du sans perte.
+    ext = config.get('output', {}).get('format', 'jpg').lstrip('.')
+
+    # Les sauvegardes partent sur le pool IO : les encodages se recouvrent
+    # entre eux, et la fin du run attend que tout soit écrit.
+    pending_saves = []
+
+    pending_saves.append(_IO_POOL.submit(
+        io.save_image, initial_transmission, os.path.join(figures_dir, f"transmission_initial.{ext}")
+    ))
     for method_name, result_img in results.items():
-        filename = f"result_dehazed_{method_name.lower().replace(' ', '_')}.png"
-        io.save_image(result_img, os.path.join(figures_dir, filename))
+        filename = f"result_dehazed_{method_name.lower().replace(' ', '_')}.{ext}"
+        # recover_scene_radiance clippe déjà sa sortie dans [0, 1].
+        pending_saves.append(_IO_POOL.submit(
+            io.save_image, result_img, os.path.join(figures_dir, filename), already_clipped=True
+        ))
+
+    # Quantification uint8 unique par carte : réutilisée par la sauvegarde
+    # individuelle et par la figure comparative.
+    transmissions_u8 = {
+        method_name: (np.clip(trans_map, 0, 1) * 255.0 + 0.5).astype(np.uint8)
+        for method_name, trans_map in transmissions.items()
+    }
+
+    # Les cartes par méthode apparaissent déjà dans la figure comparative ;
+    # leurs fichiers individuels ne sont écrits que sur demande explicite.
+    if config.get('output', {}).get('save_individual_maps', False):
+        for method_name, trans_u8 in transmissions_u8.items():
+            filename = f"transmission_{method_name.lower().replace(' ', '_')}.{ext}"
+            pending_saves.append(_IO_POOL.submit(
+                vis.save_transmission_map, trans_u8, os.path.join(figures_dir, filename)
+            ))
 
-    for method_name, trans_map in transmissions.items():
-        filename = f"transmission_{method_name.lower().replace(' ', '_')}.png"
-        vis.save_transmission_map(trans_map, os.path.join(figures_dir, filename))
-    
     if results:
-        vis.save_comparison_figure(
-            hazy_image, results, transmissions,
+        pending_saves.append(_IO_POOL.submit(
+            vis.save_comparison_figure, hazy_image, results, transmissions_u8,
             os.path.join(figures_dir, "comparison.png")
-        )
+        ))
+
+    for future in pending_saves:
+        future.result()
 
     logging.info(f"Traitement terminé pour {output_dir}")
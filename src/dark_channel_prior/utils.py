@@ -5,6 +5,7 @@ Fonctions utilitaires générales pour le projet.
 import logging
 import os
 import itertools
+import pickle
 from typing import Dict, Any, Iterator, Tuple
 
 def setup_logging(log_dir: str, config: Dict[str, Any]):
@@ -34,16 +35,6 @@ def setup_logging(log_dir: str, config: Dict[str, Any]):
     logging.info(f"Logging configuré. Niveau: {log_level_str}. Fichier: {log_path}")
 
 
-def _deep_update(d: Dict, u: Dict) -> Dict:
-    """Met à jour un dictionnaire de manière récursive."""
-    for k, v in u.items():
-        if isinstance(v, dict):
-            d[k] = _deep_update(d.get(k, {}), v)
-        else:
-            d[k] = v
-    return d
-
-
 def _set_nested_key(d: Dict, key_path: str, value: Any):
     """Définit une valeur dans un dictionnaire imbriqué en utilisant un chemin de clé."""
     keys = key_path.split('.')
@@ -77,8 +68,13 @@ def generate_experiment_configs(exp_config: Dict[str, Any]) -> Iterator[Tuple[st
     param_names = list(param_grid.keys())
     param_values = list(param_grid.values())
 
+    # Copie profonde par pickle : la base est sérialisée une seule fois, puis
+    # chaque combinaison la recharge en C — bien plus rapide que de reparcourir
+    # récursivement le dictionnaire à chaque itération.
+    base_blob = pickle.dumps(base_config, protocol=pickle.HIGHEST_PROTOCOL)
+
     for combination in itertools.product(*param_values):
-        run_config = _deep_update({}, base_config)
+        run_config = pickle.loads(base_blob)
         run_name_parts = []
 
         for param_name, value in zip(param_names, combination):
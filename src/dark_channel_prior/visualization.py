@@ -2,22 +2,67 @@
 Fonctions pour la visualisation et la sauvegarde de figures.
 """
 
-import matplotlib
-matplotlib.use('Agg') # Evite d'utiliser tkinter
-import matplotlib.pyplot as plt
 import numpy as np
+from PIL import Image, ImageDraw
+
+# LUT 256 entrées par colormap, construites une seule fois : appliquer la
+# colormap devient une simple indexation au lieu d'un rendu matplotlib complet.
+_CMAP_LUTS = {}
+
+# Largeur d'un panneau de la mosaïque comparative ; la hauteur suit le ratio
+# de l'image d'entrée.
+_PANEL_WIDTH = 512
+
+
+def _get_cmap_lut(cmap: str) -> np.ndarray:
+    """Retourne (et met en cache) la table RGB uint8 à 256 entrées d'une colormap."""
+    lut = _CMAP_LUTS.get(cmap)
+    if lut is None:
+        import matplotlib
+        lut = (matplotlib.colormaps[cmap](np.arange(256) / 255.0)[:, :3] * 255).astype(np.uint8)
+        _CMAP_LUTS[cmap] = lut
+    return lut
+
+
+def _to_panel(image_np: np.ndarray, panel_size: tuple) -> Image.Image:
+    """
+    Convertit un tableau 2D ou RGB en vignette PIL RGB.
+    Un tableau déjà en uint8 est utilisé tel quel, sans requantification.
+    """
+    if image_np.dtype == np.uint8:
+        u8 = image_np
+    else:
+        u8 = (np.clip(image_np, 0, 1) * 255.0 + 0.5).astype(np.uint8)
+    panel = Image.fromarray(u8)
+    if panel.mode != 'RGB':
+        panel = panel.convert('RGB')
+    return panel.resize(panel_size, Image.BILINEAR)
+
 
 def save_transmission_map(transmission_map: np.ndarray, save_path: str, cmap: str = 'gray'):
     """
-    Sauvegarde la carte de transmission en tant qu'image en utilisant matplotlib.
+    Sauvegarde la carte de transmission en tant qu'image.
+
+    L'écriture passe directement par PIL : la carte est quantifiée en uint8 et,
+    pour une colormap autre que 'gray', colorisée par une LUT pré-calculée —
+    sans figure ni backend matplotlib.
 
     Args:
-        transmission_map (np.ndarray): Carte de transmission 2D.
+        transmission_map (np.ndarray): Carte de transmission 2D (float 0-1,
+                                       ou déjà quantifiée en uint8).
         save_path (str): Chemin de destination du fichier.
         cmap (str): Colormap à utiliser pour la visualisation.
     """
     try:
-        plt.imsave(save_path, transmission_map, cmap=cmap, vmin=0, vmax=1)
+        if transmission_map.dtype == np.uint8:
+            u8 = transmission_map
+        else:
+            u8 = (np.clip(transmission_map, 0, 1) * 255.0 + 0.5).astype(np.uint8)
+        if cmap == 'gray':
+            img = Image.fromarray(u8, mode='L')
+        else:
+            img = Image.fromarray(_get_cmap_lut(cmap)[u8])
+        img.save(save_path)
         print(f"Carte de transmission sauvegardée à : {save_path}")
     except Exception as e:
         print(f"Erreur lors de la sauvegarde de la carte de transmission : {e}")
@@ -32,6 +77,10 @@ def save_comparison_figure(
     Sauvegarde une figure comparative montrant l'image originale, les différents
     résultats de suppression de brume et leurs cartes de transmission.
 
+    La figure est assemblée directement en PIL (mosaïque de vignettes + titres
+    incrustés) : pas de moteur de rendu matplotlib, chaque panneau est un
+    simple redimensionnement suivi d'un collage.
+
     Args:
         original (np.ndarray): Image originale brumeuse.
         results_dict (dict): Dictionnaire de { 'Nom de la méthode': image_resultat }.
@@ -40,35 +89,30 @@ def save_comparison_figure(
     """
     num_methods = len(results_dict)
     num_cols = 1 + num_methods
-    
-    fig, axes = plt.subplots(2, num_cols, figsize=(6 * num_cols, 10))
-    
-    # --- Ligne 1: Images ---
-    axes[0, 0].imshow(original)
-    axes[0, 0].set_title("Image Originale Brumeuse")
-    axes[0, 0].axis('off')
 
+    panel_w = _PANEL_WIDTH
+    panel_h = max(1, round(panel_w * original.shape[0] / original.shape[1]))
+    panel_size = (panel_w, panel_h)
+
+    mosaic = Image.new('RGB', (num_cols * panel_w, 2 * panel_h), color=(0, 0, 0))
+    draw = ImageDraw.Draw(mosaic)
+
+    def _paste(image_np, title, col, row):
+        x, y = col * panel_w, row * panel_h
+        mosaic.paste(_to_panel(image_np, panel_size), (x, y))
+        draw.text((x + 10, y + 10), title, fill=(255, 255, 255))
+
+    # --- Ligne 1: Images ---
+    _paste(original, "Image Originale Brumeuse", 0, 0)
     for i, (method_name, result_img) in enumerate(results_dict.items()):
-        ax = axes[0, i + 1]
-        ax.imshow(result_img)
-        ax.set_title(f"Résultat ({method_name})")
-        ax.axis('off')
-        
-    # --- Ligne 2: Cartes de transmission ---
-
-    axes[1, 0].axis('off') 
-    
+        _paste(result_img, f"Résultat ({method_name})", i + 1, 0)
+
+    # --- Ligne 2: Cartes de transmission (case sous l'originale laissée noire) ---
     for i, (method_name, trans_map) in enumerate(transmissions_dict.items()):
-        ax = axes[1, i + 1]
-        im = ax.imshow(trans_map, cmap='gray', vmin=0, vmax=1)
-        ax.set_title(f"Transmission ({method_name})")
-        ax.axis('off')
-
-    for i in range(num_methods + 1, num_cols):
-        axes[0, i].axis('off')
-        axes[1, i].axis('off')
-
-    plt.tight_layout()
-    fig.savefig(save_path, bbox_inches='tight')
-    plt.close(fig)
-    print(f"Figure de comparaison sauvegardée à : {save_path}")
\ No newline at end of file
+        _paste(trans_map, f"Transmission ({method_name})", i + 1, 1)
+
+    if save_path.lower().endswith(('.jpg', '.jpeg')):
+        mosaic.save(save_path, quality=90)
+    else:
+        mosaic.save(save_path)
+    print(f"Figure de comparaison sauvegardée à : {save_path}")